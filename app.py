@@ -0,0 +1,460 @@
+"""ZeroRange exhibition backend.
+
+Small Flask service the exhibition page (index.html) talks to. It keeps the
+Google API key and the Drive/Sheets IDs server-side and exposes:
+
+    /                       tiny status page
+    /api/config             which pieces are configured (booleans only)
+    /api/status             health check used by the frontend
+    /api/discover           numbered images found in the Drive folder
+    /api/sheets             the memory-card sheet as CSV
+    /api/proxy-image/<id>   proxies a Drive image so the browser can load it
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import httpx
+import orjson
+from cachetools import TTLCache, cached
+from flask import Flask, Response, jsonify, request
+from flask.json.provider import JSONProvider
+
+app = Flask(__name__)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson; noticeably faster than stdlib
+    json on the large /api/discover payloads."""
+
+    def dumps(self, obj, **kwargs):
+        # OPT_NON_STR_KEYS matches stdlib json: the discover mapping is
+        # keyed by int and must serialize as string keys.
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app.json = OrjsonProvider(app)
+
+GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY', '')
+DRIVE_FOLDER_ID = os.environ.get('DRIVE_FOLDER_ID', '')
+SHEETS_ID = os.environ.get('SHEETS_ID', '')
+
+# One pooled client for every outbound call, so connections to the Google
+# hosts are reused instead of re-handshaking each time. All three hosts speak
+# HTTP/2, so paginated listings and parallel Sheets probes multiplex over a
+# single connection.
+CLIENT = httpx.Client(
+    http2=True,
+    follow_redirects=True,
+    timeout=httpx.Timeout(10.0, read=30.0),
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+    headers={'User-Agent': 'ZeroRange/1.0'},
+)
+
+# Numeric index embedded in the exhibition filenames (e.g. img_042.jpg -> 42).
+# Anchored to the digits right before the extension, so a stray number earlier
+# in the name (camera prefixes, dates) can't be mistaken for the index.
+_FILENAME_INDEX_RE = re.compile(r'(\d+)(?=\.[^.]+$)')
+
+# Content type Sheets answers with when the sheet isn't shared publicly.
+CT_HTML = 'text/html'
+
+# Constant pieces of the per-file URLs, hoisted out of the filter loop.
+_DL_PREFIX = 'https://drive.google.com/uc?id='
+_DL_SUFFIX = '&export=download'
+_PROXY_PREFIX = '/api/proxy-image/'
+
+# Drive listing cache so the frontend's 30s auto-refresh doesn't hammer the
+# API. Keyed per folder so listings for different folders coexist within the
+# TTL window instead of evicting each other.
+_drive_cache = TTLCache(maxsize=64, ttl=30)
+
+# Proxied image bodies, LRU-ordered and capped by total bytes. The exhibition
+# photos rarely change, so repeat views are served without touching Drive.
+_IMG_CACHE = OrderedDict()  # file_id -> (data, content_type, timestamp)
+_img_cache_bytes = 0
+_IMG_MAX_BYTES = 256 * 1024 * 1024
+_IMG_ITEM_MAX_BYTES = 32 * 1024 * 1024  # bigger bodies are streamed, not cached
+_IMG_TTL = 600
+# Hard ceiling on a single proxied download, so a file_id pointing at an
+# arbitrarily large Drive asset can't tie up memory and egress.
+_PROXY_MAX_BYTES = 25 * 1024 * 1024
+_img_lock = threading.Lock()
+
+# Which of the Sheets export URL formats worked last time, per sheet, so
+# steady-state requests skip the failed probes; plus a short-lived CSV cache.
+_SHEET_FORMAT = {}  # sheet_id -> index into the url_formats list
+_SHEET_CSV_CACHE = {}  # sheet_id -> (timestamp, csv_text, url_used)
+_SHEET_TTL = 15
+_sheet_lock = threading.Lock()
+
+
+def _img_cache_get(file_id):
+    """Return (data, content_type) for an unexpired cached image, else None."""
+    global _img_cache_bytes
+    with _img_lock:
+        entry = _IMG_CACHE.get(file_id)
+        if entry is None:
+            return None
+        data, content_type, timestamp = entry
+        if time.time() - timestamp >= _IMG_TTL:
+            del _IMG_CACHE[file_id]
+            _img_cache_bytes -= len(data)
+            return None
+        _IMG_CACHE.move_to_end(file_id)
+        return data, content_type
+
+
+def _img_cache_put(file_id, data, content_type):
+    global _img_cache_bytes
+    if len(data) > _IMG_ITEM_MAX_BYTES:
+        return
+    with _img_lock:
+        old = _IMG_CACHE.pop(file_id, None)
+        if old is not None:
+            _img_cache_bytes -= len(old[0])
+        _IMG_CACHE[file_id] = (data, content_type, time.time())
+        _img_cache_bytes += len(data)
+        while _img_cache_bytes > _IMG_MAX_BYTES:
+            _, (evicted, _, _) = _IMG_CACHE.popitem(last=False)
+            _img_cache_bytes -= len(evicted)
+
+
+@app.after_request
+def add_cors_headers(response):
+    # The page is hosted separately (GitHub Pages), so every endpoint needs CORS.
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+@cached(_drive_cache, lock=threading.Lock())
+def _fetch_drive_files(folder_id):
+    """List and filter a Drive folder; results are memoized by the TTL cache
+    on the decorator, which handles expiry, eviction and locking for us."""
+    url = 'https://www.googleapis.com/drive/v3/files'
+    params = {
+        'q': f"'{folder_id}' in parents and mimeType contains 'image/' and trashed=false",
+        'key': GOOGLE_API_KEY,
+        'pageSize': 1000,
+        'fields': 'nextPageToken, files(id, name, mimeType, modifiedTime)',
+    }
+    # Images are filtered server-side via the query; follow nextPageToken so
+    # folders with more than 1000 files are listed completely.
+    files = []
+    page_token = None
+    while True:
+        page_params = dict(params)
+        if page_token:
+            page_params['pageToken'] = page_token
+        response = CLIENT.get(url, params=page_params, timeout=10)
+        response.raise_for_status()
+        payload = orjson.loads(response.content)
+        files.extend(payload.get('files', []))
+        page_token = payload.get('nextPageToken')
+        if not page_token:
+            break
+    # Count outcomes instead of printing per file: for a 1000-file folder the
+    # per-line stdout writes dominated this loop.
+    non_image = 0
+    skipped_no_number = 0
+    image_files = []
+    append = image_files.append
+    for file in files:
+        mime_type = file.get('mimeType', '')
+        if not mime_type.startswith('image/'):
+            non_image += 1
+            continue
+        name = file['name']
+        match = _FILENAME_INDEX_RE.search(name)
+        if not match:
+            skipped_no_number += 1
+            continue
+        file_id = file['id']
+        append({
+            'id': file_id,
+            'name': name,
+            'index': int(match.group(1)),
+            'url': _DL_PREFIX + file_id + _DL_SUFFIX,
+            'proxy_url': _PROXY_PREFIX + file_id,
+            'modified': file.get('modifiedTime', ''),
+        })
+
+    app.logger.info(
+        "Drive listing for %s: files=%d images=%d skipped_no_number=%d non_image=%d",
+        folder_id, len(files), len(image_files), skipped_no_number, non_image,
+    )
+
+    etag = hashlib.blake2b(orjson.dumps(image_files), digest_size=16).hexdigest()
+    return image_files, etag
+
+
+def get_drive_files(folder_id):
+    """Return (image_files, etag) for a Drive folder. The files are unordered
+    (the frontend looks images up by index) and the etag fingerprints the
+    listing so /api/discover can answer conditional requests with a 304."""
+    return _fetch_drive_files(folder_id)
+
+
+# The configuration can't change while the process runs, so the status page
+# is rendered once at import; only the timestamp is substituted per request.
+_INDEX_HTML = """<!DOCTYPE html>
+<html>
+<head><title>ZeroRange backend</title></head>
+<body style="font-family: monospace; padding: 2em;">
+<h1>ZeroRange backend</h1>
+<ul>
+<li>Google API key: {}</li>
+<li>Drive folder: {}</li>
+<li>Sheets ID: {}</li>
+</ul>
+<p>Server time: %s</p>
+</body>
+</html>""".format(
+    '✅ configured' if GOOGLE_API_KEY else '❌ missing',
+    '✅ configured' if DRIVE_FOLDER_ID else '❌ missing',
+    '✅ configured' if SHEETS_ID else '❌ missing',
+)
+
+
+@app.route('/')
+def index():
+    return Response(
+        _INDEX_HTML % datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        mimetype='text/html',
+    )
+
+
+# Likewise constant for the lifetime of the process.
+_CONFIG_FLAGS = {
+    'api_configured': bool(GOOGLE_API_KEY),
+    'folder_configured': bool(DRIVE_FOLDER_ID),
+    'sheets_configured': bool(SHEETS_ID),
+}
+
+
+@app.route('/api/config')
+def get_config():
+    return jsonify(_CONFIG_FLAGS)
+
+
+@app.route('/api/status')
+def get_status():
+    return jsonify({
+        **_CONFIG_FLAGS,
+        'cache_entries': len(_drive_cache),
+        'timestamp': datetime.now().isoformat(),
+    })
+
+
+@app.route('/api/discover')
+def discover_images():
+    if not GOOGLE_API_KEY or not DRIVE_FOLDER_ID:
+        return jsonify({'success': False, 'error': 'Drive access is not configured on the server'})
+    try:
+        files, etag = get_drive_files(DRIVE_FOLDER_ID)
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'public, max-age=30'})
+        image_mapping = {
+            file['index']: {
+                'id': file['id'],
+                'name': file['name'],
+                'url': file['url'],
+                'proxy_url': file['proxy_url'],
+                'modified': file['modified'],
+            }
+            for file in files
+        }
+        response = jsonify({
+            'success': True,
+            'images': image_mapping,
+            'total_found': len(image_mapping),
+        })
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'public, max-age=30'
+        return response
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+@app.route('/api/proxy-image/<file_id>')
+def proxy_image(file_id):
+    # A conditional request means the browser already has the bytes; pass the
+    # validators through to Drive rather than answering from the local cache.
+    conditional = {
+        name: request.headers[name]
+        for name in ('If-None-Match', 'If-Modified-Since')
+        if name in request.headers
+    }
+
+    if not conditional:
+        cached = _img_cache_get(file_id)
+        if cached is not None:
+            data, content_type = cached
+            return Response(
+                data,
+                mimetype=content_type,
+                headers={'Cache-Control': 'public, max-age=3600', 'Content-Length': str(len(data))},
+            )
+
+    drive_url = _DL_PREFIX + file_id + _DL_SUFFIX
+    try:
+        upstream = CLIENT.send(
+            CLIENT.build_request('GET', drive_url, headers=conditional), stream=True
+        )
+        if upstream.status_code == 304:
+            headers = {'Cache-Control': 'public, max-age=3600'}
+            for header in ('ETag', 'Last-Modified'):
+                if header in upstream.headers:
+                    headers[header] = upstream.headers[header]
+            upstream.close()
+            return Response(status=304, headers=headers)
+        upstream.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        e.response.close()
+        return jsonify({'success': False, 'error': str(e)}), 502
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 502
+
+    content_type = upstream.headers.get('content-type', 'image/jpeg')
+    if not content_type.startswith('image/'):
+        upstream.close()
+        return jsonify({'success': False, 'error': f'Not an image ({content_type})'}), 415
+
+    declared_length = upstream.headers.get('Content-Length', '')
+    if declared_length.isdigit() and int(declared_length) > _PROXY_MAX_BYTES:
+        upstream.close()
+        return jsonify({'success': False, 'error': 'Image exceeds the proxy size limit'}), 413
+
+    def generate():
+        # Relay 64 KiB chunks as they arrive, so the download to the browser
+        # overlaps the download from Drive and memory stays flat per request.
+        # Accumulate them on the side (up to the per-item cap) so the next
+        # viewer of the same image is served from the cache.
+        pieces = []
+        size = 0
+        try:
+            for chunk in upstream.iter_bytes(65536):
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > _PROXY_MAX_BYTES:
+                    # No Content-Length was declared; cut the transfer off
+                    # rather than relaying an unbounded body.
+                    app.logger.warning("Aborting oversized proxied image %s", file_id)
+                    return
+                if pieces is not None:
+                    if size > _IMG_ITEM_MAX_BYTES:
+                        pieces = None
+                    else:
+                        pieces.append(chunk)
+                yield chunk
+            if pieces is not None:
+                _img_cache_put(file_id, b''.join(pieces), content_type)
+        finally:
+            upstream.close()
+
+    headers = {'Cache-Control': 'public, max-age=3600'}
+    for header in ('Content-Length', 'ETag', 'Last-Modified'):
+        if header in upstream.headers:
+            headers[header] = upstream.headers[header]
+    return Response(generate(), mimetype=content_type, headers=headers)
+
+
+def _csv_from_response(response):
+    """Return the sheet body as text if the response looks like CSV, else None."""
+    content_type = response.headers.get('content-type', '')
+    if CT_HTML in content_type.lower():
+        app.logger.debug("%s returned HTML (sheet not shared publicly?)", response.url)
+        return None
+    if response.status_code != 200:
+        return None
+    # Decode the raw bytes exactly once; response.text would run its own
+    # encoding detection and a second full decode. Sheets exports are UTF-8
+    # in practice whatever the header claims, so try that first.
+    raw = response.content
+    try:
+        csv_text = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        csv_text = raw.decode(response.encoding or 'utf-8', errors='replace')
+    csv_text = csv_text.strip()
+    # Looking at the head is enough to tell CSV from an error page; scanning
+    # a multi-MB body twice is not.
+    head = csv_text[:4096]
+    if '\n' in head or ',' in head:
+        return csv_text
+    return None
+
+
+@app.route('/api/sheets')
+def get_sheets_data():
+    if not SHEETS_ID:
+        return jsonify({'success': False, 'error': 'Sheets access is not configured on the server'})
+
+    now = time.time()
+    with _sheet_lock:
+        cached = _SHEET_CSV_CACHE.get(SHEETS_ID)
+        if cached is not None and now - cached[0] < _SHEET_TTL:
+            return jsonify({'success': True, 'csv_data': cached[1], 'url_used': cached[2]})
+        known_format = _SHEET_FORMAT.get(SHEETS_ID)
+
+    # Depending on how the sheet is shared, a different export URL works;
+    # try the one that worked last time first, then the rest in order.
+    url_formats = [
+        f"https://docs.google.com/spreadsheets/d/{SHEETS_ID}/export?format=csv",
+        f"https://docs.google.com/spreadsheets/d/{SHEETS_ID}/export?format=csv&gid=0",
+        f"https://docs.google.com/spreadsheets/d/{SHEETS_ID}/gviz/tq?tqx=out:csv",
+        f"https://docs.google.com/spreadsheets/d/{SHEETS_ID}/pub?output=csv",
+    ]
+    def found(format_index, csv_text, url):
+        with _sheet_lock:
+            _SHEET_FORMAT[SHEETS_ID] = format_index
+            _SHEET_CSV_CACHE[SHEETS_ID] = (now, csv_text, url)
+        return jsonify({'success': True, 'csv_data': csv_text, 'url_used': url})
+
+    last_error = None
+    remaining = list(range(len(url_formats)))
+
+    # The memoized format almost always works; try it alone before fanning out.
+    if known_format is not None:
+        try:
+            csv_text = _csv_from_response(CLIENT.get(url_formats[known_format], timeout=10))
+            if csv_text is not None:
+                return found(known_format, csv_text, url_formats[known_format])
+        except Exception as e:
+            last_error = e
+        remaining.remove(known_format)
+
+    # Probe the remaining formats concurrently and take the first valid CSV,
+    # so one slow or timing-out format doesn't delay the others.
+    executor = ThreadPoolExecutor(max_workers=len(remaining))
+    try:
+        futures = {
+            executor.submit(CLIENT.get, url_formats[i], timeout=10): i
+            for i in remaining
+        }
+        for future in as_completed(futures):
+            try:
+                csv_text = _csv_from_response(future.result())
+            except Exception as e:
+                last_error = e
+                continue
+            if csv_text is not None:
+                format_index = futures[future]
+                return found(format_index, csv_text, url_formats[format_index])
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return jsonify({'success': False, 'error': f'Could not fetch the sheet as CSV ({last_error})'})
+
+
+if __name__ == '__main__':
+    # Local development only; production runs under gunicorn (see wsgi.py).
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=False, threaded=True)
@@ -0,0 +1,9 @@
+"""WSGI entry point for production.
+
+Run with a threaded worker pool so concurrent image proxy requests overlap
+instead of serializing behind Werkzeug's dev server:
+
+    gunicorn -w 2 -k gthread --threads 16 --timeout 60 wsgi:app
+"""
+
+from app import app  # noqa: F401